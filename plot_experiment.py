@@ -15,12 +15,20 @@
 
 """Helper script to plot the results of an experiment run with the run_experiment.sh script."""
 
-import glob
-import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import fnmatch
+import functools
+import itertools
 import math
+import os
 import sys
 import textwrap
+from typing import Dict
+from typing import Iterable
 from typing import List
+from typing import Optional
 from typing import Tuple
 
 # Install apex_performance_plotter:
@@ -28,11 +36,25 @@ from typing import Tuple
 #   pip3 install .
 from apex_performance_plotter.load_logfiles import load_logfile
 
-# matplotlib>=3.4 is required for suptitle() and supxlabel()
+# matplotlib>=3.6 is required for set_layout_engine(), suptitle(), and supxlabel()
 import matplotlib.pyplot as plt
 
+# numba is used to compute latency statistics in a single pass, if available:
+#   pip3 install numba
+try:
+    import numba
+except ImportError:
+    numba = None
+
 import numpy as np
 
+# orjson is used to parse the (large) raw latency logfiles faster, if available:
+#   pip3 install orjson
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 import pandas as pd
 
 
@@ -41,6 +63,7 @@ freqs = [100, 500, 1000, 2000]
 msgs = [(1, 'k'), (32, 'k'), (64, 'k'), (256, 'k')]
 runtime_max = 60 * 60 + 10
 runtime_ignore = 10
+modes = ('base', 'trace')
 
 # If True, a special branch of performance_test must have been used: christophebedard/raw-data
 # From: https://gitlab.com/christophebedard/performance_test
@@ -50,9 +73,31 @@ has_raw_latency_data = True
 include_plot_title = False
 # Whether to print out approximate frequencies to confirm that the target pub/sub frequency is hit
 print_approximate_frequencies = True
+# Font sizes for plots
+font_size = 14
+title_size = 20
+
 
+# { run file -> read-only raw latencies }
+logfiles_raw: Dict[str, np.ndarray] = {}
+# { run file -> (mean, stdev, min, max, number of values) (s) }
+logfile_summaries_raw: Dict[str, Tuple[float, float, float, float, int]] = {}
+# { run file -> weighted mean latency (ms) }
+logfile_means: Dict[str, float] = {}
 
-experiment_dir = None
+
+@dataclass(frozen=True)
+class Config:
+    """Configuration for plotting the results of an experiment."""
+
+    # Name of directory containing experiment data
+    experiment_dir: str
+    # Whether the plots are going to be shown after being saved to files
+    interactive: bool = False
+    # File formats (extensions) to save the figures as
+    formats: Tuple[str, ...] = ('png',)
+    # Whether to render text using LaTeX
+    tex: bool = False
 
 
 def get_frequency_ticks(
@@ -71,35 +116,176 @@ def get_frequency_ticks(
     return list(range(freq_min, freq_max + freq_step, freq_step))
 
 
-def load_logfile_raw(filename: str) -> pd.DataFrame:
+# Frequency ticks and x axis limits used for all plots, which only depend on the experiment parameters
+frequency_ticks = get_frequency_ticks()
+frequency_xlim = (min(frequency_ticks), max(frequency_ticks) + 75)
+
+
+def cache_logfile_raw(filename: str) -> str:
     """
-    Load JSON logfile containing raw latency values.
+    Cache raw latency values from a JSON logfile in a binary .npy file next to it, if needed.
 
     Expects a simple JSON object that has a 'raw_latencies' key with an array of doubles
     representing latencies of every single received sample.
 
+    :param filename: the file name
+    :return: the cache file name
+    """
+    cache_filename = f'{filename}.npy'
+    # Only use the cache if it is not older than the logfile
+    if os.path.exists(cache_filename) and os.path.getmtime(cache_filename) >= os.path.getmtime(filename):
+        return cache_filename
+    if orjson is not None:
+        with open(filename, 'rb') as f:
+            raw_latencies = orjson.loads(f.read())['raw_latencies']
+    else:
+        # The pandas JSON parser is slower than orjson, but still much faster than the json module
+        raw_latencies = pd.read_json(filename, typ='series', precise_float=True)['raw_latencies']
+    # Write to a temporary file first so that an interrupted run does not leave an incomplete cache
+    cache_filename_tmp = f'{cache_filename}.tmp'
+    with open(cache_filename_tmp, 'wb') as f:
+        # The number of values is known, so fill a preallocated array directly
+        np.save(f, np.fromiter(raw_latencies, dtype=np.float64, count=len(raw_latencies)))
+    os.replace(cache_filename_tmp, cache_filename)
+    return cache_filename
+
+
+def load_logfile_raw(filename: str) -> np.ndarray:
+    """
+    Load JSON logfile containing raw latency values.
+
+    The raw latencies are cached in a binary .npy file next to the logfile, which is memory-mapped
+    instead of parsing the JSON logfile the next time. The values are therefore not kept in memory.
+
     :param filename: the file name
     :return: the raw latencies
     """
+    return np.load(cache_logfile_raw(filename), mmap_mode='r')
+
+
+def cache_and_summarize_logfile_raw(filename: str) -> Tuple[str, Tuple[float, float, float, float, int]]:
+    """
+    Cache raw latency values from a JSON logfile, if needed, and summarize them.
+
+    :param filename: the file name
+    :return: the cache file name, and the summary of the raw latency values
+    """
+    cache_filename = cache_logfile_raw(filename)
+    return cache_filename, summarize_latencies(np.load(cache_filename, mmap_mode='r'))
+
+
+def add_logfile_raw(
+    filename: str,
+    raw_latencies: np.ndarray,
+) -> np.ndarray:
+    """
+    Add raw latency values to logfiles_raw.
+
+    The array is made read-only, since it is shared by all users.
+
+    :param filename: the file name
+    :param raw_latencies: the raw latency values
+    :return: the read-only raw latency values
+    """
+    raw_latencies.flags.writeable = False
+    logfiles_raw[filename] = raw_latencies
+    return raw_latencies
+
+
+def load_logfiles_raw(filenames: Iterable[str]) -> None:
+    """
+    Load and summarize JSON logfiles containing raw latency values in parallel.
+
+    The raw latencies and their summaries are then available through get_logfile_raw() and
+    get_logfile_summary_raw().
+
+    :param filenames: the file names
+    """
     assert has_raw_latency_data
-    with open(filename) as f:
-        d = json.load(f)
-        return pd.DataFrame.from_dict({'raw_latencies': d['raw_latencies']})
+    filenames = [filename for filename in dict.fromkeys(filenames) if filename not in logfiles_raw]
+    # Only parse and summarize the logfiles in parallel, and then memory-map the cache files,
+    # instead of sending every raw latency value back from the worker processes
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(cache_and_summarize_logfile_raw, filenames)
+        for filename, (cache_filename, summary) in zip(filenames, results):
+            add_logfile_raw(filename, np.load(cache_filename, mmap_mode='r'))
+            logfile_summaries_raw[filename] = summary
+
+
+def get_logfile_raw(filename: str) -> np.ndarray:
+    """
+    Get raw latency values from a JSON logfile, loading it if needed.
+
+    :param filename: the file name
+    :return: the read-only raw latency values
+    """
+    if filename in logfiles_raw:
+        return logfiles_raw[filename]
+    return add_logfile_raw(filename, load_logfile_raw(filename))
+
+
+def get_logfile_summary_raw(filename: str) -> Tuple[float, float, float, float, int]:
+    """
+    Get the summary of raw latency values from a JSON logfile, loading it if needed.
+
+    :param filename: the file name
+    :return: latency mean, standard deviation, minimum, maximum (s), number of latency values
+    """
+    if filename not in logfile_summaries_raw:
+        logfile_summaries_raw[filename] = summarize_latencies(get_logfile_raw(filename))
+    return logfile_summaries_raw[filename]
 
 
-def get_file_from_prefix(prefix: str) -> str:
+@functools.lru_cache(maxsize=None)
+def get_experiment_dir_files(experiment_dir: str) -> Dict[str, str]:
+    """
+    Get files in the experiment directory, excluding PDF files and cached raw latency files.
+
+    The directory is only scanned once.
+
+    :param experiment_dir: the name of the directory containing experiment data
+    :return: the file paths indexed by file name
+    """
+    with os.scandir(f'./{experiment_dir}') as entries:
+        return {
+            entry.name: entry.path for entry in entries if not entry.name.endswith(('.pdf', '.npy', '.npy.tmp'))
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_file_from_prefix(
+    experiment_dir: str,
+    prefix: str,
+) -> str:
     """
     Get existing file path corresponding to file name prefix.
 
+    The prefix can be a glob-style pattern, which must match exactly one file.
+
+    :param experiment_dir: the name of the directory containing experiment data
     :param prefix: the file name prefix
     :return: the file path
     """
-    exp_dir_prefix = f'./{experiment_dir}/{prefix}'
-    matching_files = set(glob.glob(f'{exp_dir_prefix}')) - set(glob.glob(f'{exp_dir_prefix}*.pdf'))
-    matching_files = list(matching_files)
+    experiment_dir_files = get_experiment_dir_files(experiment_dir)
+    if prefix in experiment_dir_files:
+        return experiment_dir_files[prefix]
+    # Match against the cached file names instead of scanning the directory again
+    matching_files = fnmatch.filter(experiment_dir_files.keys(), prefix)
     assert len(matching_files) == 1, \
-        f'for {exp_dir_prefix}: len(matching_files) == {len(matching_files)}: {matching_files}'
-    return matching_files[0]
+        f'for ./{experiment_dir}/{prefix}: len(matching_files) == {len(matching_files)}: {matching_files}'
+    return experiment_dir_files[matching_files[0]]
+
+
+def get_experiment_runs() -> List[Tuple[str, int, str, int]]:
+    """
+    Get all runs of the experiment.
+
+    :return: the (mode, msg size, msg unit prefix, publishing frequency) tuple for each run
+    """
+    return [
+        (mode, msg, msg_unit, freq)
+        for mode, (msg, msg_unit), freq in itertools.product(modes, msgs, freqs)
+    ]
 
 
 def get_experiment_run_name(
@@ -117,12 +303,13 @@ def get_experiment_run_name(
     :param freq: the publishing frequency
     :return: the file name for that specific run
     """
-    assert mode in ('base', 'trace')
     # use '_s' suffix file because that's the one that contains the latency data (subscriber)
     return f'1-{mode}_Array{msg}{msg_unit}_{freq}hz_s'
 
 
+@functools.lru_cache(maxsize=None)
 def get_run_file(
+    config: Config,
     mode: str,
     msg: int,
     msg_unit: str,
@@ -131,22 +318,20 @@ def get_run_file(
     """
     Get path to data file for a specific run.
 
+    :param config: the configuration
     :param mode: the mode
     :param msg: the msg size
     :param msg_unit: the msg unit prefix
     :param freq: the publishing frequency
     :return: the path to the file for that specific run
     """
-    assert mode in ('base', 'trace')
     name = get_experiment_run_name(mode, msg, msg_unit, freq)
-    return get_file_from_prefix(name)
+    return get_file_from_prefix(config.experiment_dir, name)
 
 
-def get_latency_data(run_file: str) -> float:
+def load_logfile_mean(run_file: str) -> float:
     """
-    Get latency data.
-
-    This is the default version, which gives a mean value.
+    Load logfile and compute the weighted mean latency.
 
     :param run_file: the data file
     :return: latency mean
@@ -154,44 +339,202 @@ def get_latency_data(run_file: str) -> float:
     _, dataframe = load_logfile(run_file)
     # Weighted mean using number of received messages
     # Not great, but we don't have the raw data
-    received = dataframe['received']
-    latency_mean = dataframe['latency_mean (ms)']
-    return (received * latency_mean).sum() / received.sum()
+    received = dataframe['received'].to_numpy()
+    latency_mean = dataframe['latency_mean (ms)'].to_numpy()
+    return float(received @ latency_mean) / float(received.sum())
+
+
+def load_logfile_means(filenames: Iterable[str]) -> None:
+    """
+    Load logfiles and compute their weighted mean latencies in parallel.
 
+    The mean latencies are then available through get_latency_data().
 
-def get_latency_data_raw(run_file: str) -> Tuple[float, float, float, float, pd.Series]:
+    :param filenames: the file names
+    """
+    assert not has_raw_latency_data
+    filenames = [filename for filename in dict.fromkeys(filenames) if filename not in logfile_means]
+    with ProcessPoolExecutor() as executor:
+        for filename, latency_mean in zip(filenames, executor.map(load_logfile_mean, filenames)):
+            logfile_means[filename] = latency_mean
+
+
+def get_latency_data(run_file: str) -> float:
     """
     Get latency data.
 
-    This is the raw version, which gives  mean value.
+    This is the default version, which gives a mean value.
+    The result is kept, so that each logfile is only loaded once.
 
     :param run_file: the data file
-    :return: latency mean, standard deviation, minimum, maximum, raw latency values
+    :return: latency mean
     """
-    assert has_raw_latency_data
-    dataframe = load_logfile_raw(run_file)
+    if run_file not in logfile_means:
+        logfile_means[run_file] = load_logfile_mean(run_file)
+    return logfile_means[run_file]
+
+
+def get_latencies_raw(
+    config: Config,
+    mode: str,
+    msg: int,
+    msg_unit: str,
+    freq: int,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Get raw latency values for a specific run.
+
+    :param config: the configuration
+    :param mode: the mode
+    :param msg: the msg size
+    :param msg_unit: the msg unit prefix
+    :param freq: the publishing frequency
+    :param out: the array to write the values to, if any, which must have the right size
+    :return: the raw latency values (ms), as a new array (or out) that can be modified
+    """
+    raw_latencies = get_logfile_raw(get_run_file(config, mode, msg, msg_unit, freq))
     # Raw latencies are in seconds, so convert to milliseconds
-    raw_latencies = 1000 * dataframe['raw_latencies']
-    return raw_latencies.mean(), raw_latencies.std(), raw_latencies.min(), raw_latencies.max(), raw_latencies
+    # Do not convert in place, since the loaded array is kept
+    return np.multiply(raw_latencies, 1000.0, out=out)
+
+
+def get_latency_data_raw(
+    config: Config,
+    mode: str,
+    msg: int,
+    msg_unit: str,
+    freq: int,
+) -> Tuple[float, float, float, float, int]:
+    """
+    Get latency data for a specific run.
+
+    This is the raw version, which gives  mean value.
+    The statistics of each logfile are only computed once, see get_logfile_summary_raw();
+    use get_latencies_raw() to get the raw latency values.
+
+    :param config: the configuration
+    :param mode: the mode
+    :param msg: the msg size
+    :param msg_unit: the msg unit prefix
+    :param freq: the publishing frequency
+    :return: latency mean, standard deviation, minimum, maximum (ms), number of latency values
+    """
+    # Summarize the raw latencies (s) directly and only convert the statistics to milliseconds,
+    # instead of converting all values
+    latency_mean, latency_stdev, latency_min, latency_max, num_latencies = \
+        get_logfile_summary_raw(get_run_file(config, mode, msg, msg_unit, freq))
+    return (
+        1000.0 * latency_mean,
+        1000.0 * latency_stdev,
+        1000.0 * latency_min,
+        1000.0 * latency_max,
+        num_latencies,
+    )
+
+
+def summarize_latencies(
+    raw_latencies: np.ndarray,
+) -> Tuple[float, float, float, float, int]:
+    """
+    Compute summary statistics for raw latency values.
+
+    :param raw_latencies: the raw latency values
+    :return: latency mean, standard deviation, minimum, maximum, number of latency values
+    """
+    if numba is not None:
+        return _summarize_latencies_single_pass(raw_latencies)
+    # A run without any values has no statistics, like with pandas
+    if raw_latencies.size == 0:
+        return math.nan, math.nan, math.nan, math.nan, 0
+    # Use sample standard deviation, like pandas
+    return (
+        raw_latencies.mean(),
+        raw_latencies.std(ddof=1),
+        raw_latencies.min(),
+        raw_latencies.max(),
+        raw_latencies.size,
+    )
+
+
+def _summarize_latencies_single_pass(
+    raw_latencies: np.ndarray,
+) -> Tuple[float, float, float, float, int]:
+    """
+    Compute summary statistics for raw latency values in a single pass.
+
+    This gives the same results as the ndarray reductions in summarize_latencies(), up to rounding,
+    but only reads the values once.
+    Values are shifted by the first value to avoid losing precision when computing the variance.
+
+    :param raw_latencies: the raw latency values
+    :return: latency mean, standard deviation, minimum, maximum, number of latency values
+    """
+    num_latencies = raw_latencies.shape[0]
+    # A run without any values has no statistics, like with pandas
+    if num_latencies == 0:
+        return math.nan, math.nan, math.nan, math.nan, 0
+    shift = raw_latencies[0]
+    total = 0.0
+    total_sq = 0.0
+    latency_min = shift
+    latency_max = shift
+    for i in range(num_latencies):
+        latency = raw_latencies[i]
+        diff = latency - shift
+        total += diff
+        total_sq += diff * diff
+        if latency < latency_min:
+            latency_min = latency
+        elif latency > latency_max:
+            latency_max = latency
+    latency_mean = shift + total / num_latencies
+    # Use sample standard deviation, like pandas, which is undefined for a single value
+    latency_stdev = math.nan
+    if num_latencies >= 2:
+        # Clamp rounding errors, since the variance cannot be negative
+        latency_var = max(0.0, (total_sq - total * total / num_latencies) / (num_latencies - 1))
+        latency_stdev = math.sqrt(latency_var)
+    return latency_mean, latency_stdev, latency_min, latency_max, num_latencies
+
+
+if numba is not None:
+    _summarize_latencies_single_pass = numba.njit(cache=True, error_model='numpy')(
+        _summarize_latencies_single_pass)
 
 
 def get_approximate_frequency(
-    raw_latencies: pd.Series,
+    num_latencies: int,
 ) -> float:
     """
     Get approximate pub/sub frequency.
 
-    :param raw_latencies: the raw latency values
+    :param num_latencies: the number of raw latency values
     :return: the approximate frequency
     """
     # Each individual experiment is run for runtime_max seconds, but the first runtime_ignore
     # seconds are ignored and we don't get latency values for those, so subtract it from the total
     total_runtime = runtime_max - runtime_ignore
-    num_latencies = raw_latencies.size
     # frequency [Hz] = number of messages / total time [s]
     return float(num_latencies) / float(total_runtime)
 
 
+def get_latency_overhead(
+    latency_base: np.ndarray,
+    latency_trace: np.ndarray,
+) -> np.ndarray:
+    """
+    Get relative latency overhead of tracing.
+
+    Works with both scalars and arrays.
+
+    :param latency_base: the latency value(s) without tracing
+    :param latency_trace: the latency value(s) with tracing
+    :return: the relative latency overhead (%)
+    """
+    return 100.0 * (latency_trace - latency_base) / latency_base
+
+
 def get_full_message_size_unit(simple_unit: str) -> str:
     """Convert simple message size unit prefix to full abbreviation."""
     return {
@@ -205,39 +548,118 @@ def get_default_colors() -> List[str]:
     return [p['color'] for p in plt.rcParams['axes.prop_cycle']]
 
 
+# Figure file metadata for each format: omit the creation date, so that files only change if figures change
+figure_metadata = {
+    'pdf': {'CreationDate': None},
+    'svg': {'Date': None},
+}
+
+
+def save_figure(
+    config: Config,
+    fig,
+    filename: str,
+) -> None:
+    """
+    Save figure to files.
+
+    The figure is then closed to free its memory, unless the plots are going to be shown.
+
+    :param config: the configuration
+    :param fig: the figure
+    :param filename: the file name (without file extension)
+    """
+    filename = f'./{config.experiment_dir}/{filename}'
+    # Each format has to be rendered separately, but the layout only needs to be computed once:
+    # the first save runs the layout engine, and it is then disabled for the other formats
+    layout_engine = fig.get_layout_engine()
+    layout_done = False
+    for fmt in config.formats:
+        if fmt != 'svg':
+            fig.savefig(f'{filename}.{fmt}', metadata=figure_metadata.get(fmt))
+            if layout_engine is not None and not layout_done:
+                fig.set_layout_engine('none')
+                layout_done = True
+    # Save SVG last, since data artists are rasterized for it: serializing every data point to SVG
+    # is slow and gives big files, and this should not affect the other vector formats
+    if 'svg' in config.formats:
+        for ax in fig.axes:
+            for artist in ax.lines + ax.collections:
+                artist.set_rasterized(True)
+        fig.savefig(f'{filename}.svg', dpi=150, metadata=figure_metadata['svg'])
+    if config.interactive:
+        # Restore the layout engine, since the figure can be resized once shown
+        if layout_done:
+            fig.set_layout_engine(layout_engine)
+    else:
+        plt.close(fig)
+
+
+def plot_series(
+    ax,
+    x: List[int],
+    ys: np.ndarray,
+    labels: List[str],
+    yerrs: Optional[np.ndarray] = None,
+    marker: str = 'D',
+    capsize: float = 5.0,
+) -> None:
+    """
+    Plot multiple series with markers and optional error bars.
+
+    Each series is drawn with a single errorbar() or plot() call.
+
+    :param ax: the axis to use for plotting
+    :param x: the x values, common to all series
+    :param ys: the y values, one row per series
+    :param labels: the legend label for each series
+    :param yerrs: the symmetric y errors, one row per series, or `None` for no error bars
+    :param marker: the marker style
+    :param capsize: the length of the error bar caps (points)
+    """
+    fmt = f'{marker}-'
+    for i, (y, label) in enumerate(zip(ys, labels)):
+        if yerrs is not None:
+            ax.errorbar(x, y, yerr=yerrs[i], capsize=capsize, fmt=fmt, label=label)
+        else:
+            ax.plot(x, y, fmt, label=label)
+
+
 def plot_mode(
+    config: Config,
     ax,
     mode: str,
-) -> None:
+) -> Tuple[Dict, np.ndarray]:
     """
     Plot a given mode.
 
+    :param config: the configuration
     :param ax: the axis to use for plotting
     :param mode: the mode ('base' or 'trace')
-    :return: the min/mean/max/stdev data for each msg/freq combination
+    :return: the min/mean/max/stdev data for each msg/freq combination,
+        and the mean latencies for each (msg, freq) combination
     """
-    assert mode in ('base', 'trace')
+    assert mode in modes
 
     # { (msg, msg_unit) -> { freq -> { mean, min, max, stdev } } }
     data = {}
-    for msg, msg_unit in msgs:
+    # Mean latency and standard deviation for each (msg, freq) combination
+    latencies = np.empty((len(msgs), len(freqs)))
+    latencies_stdev = np.empty_like(latencies)
+    labels = []
+    for i, (msg, msg_unit) in enumerate(msgs):
         msg_full_unit = get_full_message_size_unit(msg_unit)
-        msg_freqs = []
-        msg_latencies = []
-        msg_latencies_stdev = []
-        msg_latencies_raw = []
         # { freq -> { mean, min, max, stdev } }
         data_freq = {}
-        for freq in freqs:
-            run_file = get_run_file(mode, msg, msg_unit, freq)
-
-            latency_mean = None
-            if has_raw_latency_data:
-                latency_mean, latency_stdev, latency_min, latency_max, latencies_raw = get_latency_data_raw(run_file)
-                msg_latencies_stdev.append(latency_stdev)
-                msg_latencies_raw.append(latencies_raw)
+        if has_raw_latency_data:
+            # Summarize all runs for this msg size first, then fill the rows at once
+            summaries = [get_latency_data_raw(config, mode, msg, msg_unit, freq) for freq in freqs]
+            latencies_mean_msg, latencies_stdev_msg, _, _, _ = zip(*summaries)
+            latencies[i] = latencies_mean_msg
+            latencies_stdev[i] = latencies_stdev_msg
+            for freq, (latency_mean, latency_stdev, latency_min, latency_max, num_latencies) in zip(freqs, summaries):
                 if print_approximate_frequencies:
-                    approx_freq = get_approximate_frequency(latencies_raw)
+                    approx_freq = get_approximate_frequency(num_latencies)
                     is_freq_good = not math.isclose(0, approx_freq) and abs(freq - approx_freq) <= 0.1
                     freq_result_char = '✅' if is_freq_good else '❌'
                     print(
@@ -250,31 +672,45 @@ def plot_mode(
                     'max': latency_max,
                     'stdev': latency_stdev,
                 }
-            else:
-                latency_mean = get_latency_data(run_file)
-
-            msg_latencies.append(latency_mean)
-            msg_freqs.append(freq)
+        else:
+            latencies[i] = [get_latency_data(get_run_file(config, mode, msg, msg_unit, freq)) for freq in freqs]
 
         data[(msg, msg_unit)] = data_freq
+        labels.append(f'{msg} {msg_full_unit}')
 
-        label = f'{msg} {msg_full_unit}'
-        if has_raw_latency_data:
-            ax.errorbar(
-                msg_freqs, msg_latencies,
-                yerr=msg_latencies_stdev,
-                capsize=5, fmt='D-', label=label)
-        else:
-            ax.plot(msg_freqs, msg_latencies, 'D-', label=label)
+    plot_series(ax, freqs, latencies, labels, yerrs=latencies_stdev if has_raw_latency_data else None)
 
-    xticks = get_frequency_ticks()
-    ax.set(xticks=xticks, xlim=(min(xticks), max(xticks) + 75))
+    ax.set(xticks=frequency_ticks, xlim=frequency_xlim)
     ax.grid()
 
-    return data
+    return data, latencies
+
+
+# LaTeX table templates for export_table()
+latex_table_before = textwrap.dedent(r"""
+    \begin{table}[htb!]
+    \begin{center}
+    \caption{$caption}
+    \begin{tabular}{ccccccc}
+    \toprule
+    % \multirow{2}{*}{\textbf{Message size (KiB)}} & \multirow{2}{*}{\textbf{Rate (Hz)}} & \multirow{2}{*}{\textbf{Tracing (N/Y)}} & \textbf{Min.} & \textbf{Avg.} & \textbf{Max.} & \textbf{Std.} \\
+    \textbf{Message size} & \textbf{Rate} & \textbf{Tracing} & \textbf{Min.} & \textbf{Avg.} & \textbf{Max.} & \textbf{Std.} \\
+    % \cline{4-7}
+    % \textbf{(KiB)} & \textbf{(Hz)} & \textbf{(N/Y)} & \multicolumn{4}{c}{\textbf{(ms)}} \\
+    \textbf{(KiB)} & \textbf{(Hz)} & \textbf{(N/Y)} & \textbf{(ms)} & \textbf{(ms)} & \textbf{(ms)} & \textbf{(ms)} \\
+    \midrule
+    """)  # noqa: E501
+latex_table_after = textwrap.dedent(r"""
+    \bottomrule
+    \end{tabular}
+    \label{tab:$label}
+    \end{center}
+    \end{table}
+    """)
 
 
 def export_table(
+    config: Config,
     data_base,
     data_trace,
     table_filename: str = '6_results_latencies_table',
@@ -284,6 +720,7 @@ def export_table(
     """
     Generate LaTeX table from data and write to file.
 
+    :param config: the configuration
     :param data_base: the data without tracing
     :param data_trace: the data with tracing
     :param table_filename: base file name for the table file (without file extension)
@@ -293,33 +730,13 @@ def export_table(
     assert 0 < len(data_base)
     assert 0 < len(data_trace)
 
-    filename = f'./{experiment_dir}/{table_filename}.tex'
-    f = open(filename, 'w')
-
-    before = textwrap.dedent(r"""
-        \begin{table}[htb!]
-        \begin{center}
-        \caption{$caption}
-        \begin{tabular}{ccccccc}
-        \toprule
-        % \multirow{2}{*}{\textbf{Message size (KiB)}} & \multirow{2}{*}{\textbf{Rate (Hz)}} & \multirow{2}{*}{\textbf{Tracing (N/Y)}} & \textbf{Min.} & \textbf{Avg.} & \textbf{Max.} & \textbf{Std.} \\
-        \textbf{Message size} & \textbf{Rate} & \textbf{Tracing} & \textbf{Min.} & \textbf{Avg.} & \textbf{Max.} & \textbf{Std.} \\
-        % \cline{4-7}
-        % \textbf{(KiB)} & \textbf{(Hz)} & \textbf{(N/Y)} & \multicolumn{4}{c}{\textbf{(ms)}} \\
-        \textbf{(KiB)} & \textbf{(Hz)} & \textbf{(N/Y)} & \textbf{(ms)} & \textbf{(ms)} & \textbf{(ms)} & \textbf{(ms)} \\
-        \midrule
-        """).replace('$caption', table_caption)  # noqa: E501
-    after = textwrap.dedent(r"""
-        \bottomrule
-        \end{tabular}
-        \label{tab:$label}
-        \end{center}
-        \end{table}
-        """).replace('$label', table_label)
-
-    print(before, file=f)
-
-    def print_data(
+    before = latex_table_before.replace('$caption', table_caption)
+    after = latex_table_after.replace('$label', table_label)
+
+    # Collect all lines and write them at once at the end
+    lines = [before]
+
+    def add_data(
         col_type,
         msg_col,
         freq_col,
@@ -330,36 +747,40 @@ def export_table(
         d_max = data['max']
         d_stdev = data['stdev']
         d = f'{msg_col} & {freq_col} & {col_type} & {d_min:.3f} & {d_mean:.3f} & {d_max:.3f} & {d_stdev:.3f} \\\\'
-        print(d, file=f)
+        lines.append(d)
 
-    for msg, msg_unit in msgs:
-        for freq in freqs:
+    for i, (msg, msg_unit) in enumerate(msgs):
+        for j, freq in enumerate(freqs):
             # Frequency value column covers both rows
             freq_col = f'\multirow{{2}}{{*}}{{{freq}}}'  # noqa: W605
             # Use multirow for msg column if first frequency row for this msg size
             msg_col = ''
-            first_freq = 0 == freqs.index(freq)
+            first_freq = 0 == j
             if first_freq:
                 msg_col = f'\multirow{{{len(freqs) * 2}}}{{*}}{{{msg}}}'  # noqa: W605
 
-            print_data('N', msg_col, freq_col, data_base[(msg, msg_unit)][freq])
-            print_data('Y', '', '', data_trace[(msg, msg_unit)][freq])
+            add_data('N', msg_col, freq_col, data_base[(msg, msg_unit)][freq])
+            add_data('Y', '', '', data_trace[(msg, msg_unit)][freq])
 
             # Only put separator between frequencies if not the last frequency
-            last_freq = freqs.index(freq) == len(freqs) - 1
+            last_freq = j == len(freqs) - 1
             if not last_freq:
-                print(r'\cline{2-7}', file=f)
+                lines.append(r'\cline{2-7}')
 
         # Only put a separator between messages if not the last message
-        last_msg = msgs.index((msg, msg_unit)) == len(msgs) - 1
+        last_msg = i == len(msgs) - 1
         if not last_msg:
-            print(r'\hline', file=f)
+            lines.append(r'\hline')
 
-    print(after, file=f)
-    f.close()
+    lines.append(after)
+
+    filename = f'./{config.experiment_dir}/{table_filename}.tex'
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
 
 
 def plot_modes(
+    config: Config,
     title: str = 'Message latencies without (left) vs. with tracing (right)',
     xlabel: str = 'publishing frequency (Hz)',
     ylabel: str = 'mean latency (ms)',
@@ -367,53 +788,64 @@ def plot_modes(
     legend_fontsize: int = 12,
     legend_loc: str = 'center',
     legend_bbox_to_anchor: Tuple[float, float] = (0.725, 0.675),  # Configured manually
-) -> None:
+) -> Tuple[np.ndarray, np.ndarray]:
     """
     Plot baseline and tracing latency results separately.
 
+    :param config: the configuration
     :param title: plot title
     :param xlabel: x axis label
     :param ylabel: y axis label
     :param figure_filename: base file name for the figure (without file extension)
     :param legend_fontsize: the legend font size;
         a lower value than the default can help make it fit better into the plot
+    :return: the mean latencies for each (msg, freq) combination, without and with tracing
     """
     if print_approximate_frequencies:
         print('Approximate pub-sub frequencies:')
 
     fig, (ax1, ax2) = plt.subplots(1, 2, sharey=True, constrained_layout=True)
 
-    data_base = plot_mode(ax1, 'base')
-    data_trace = plot_mode(ax2, 'trace')
+    data_base, latencies_mean_base = plot_mode(config, ax1, 'base')
+    data_trace, latencies_mean_trace = plot_mode(config, ax2, 'trace')
 
     if include_plot_title:
-        fig.suptitle(title, size=plt.rcParams['axes.titlesize'])
-    fig.supxlabel(xlabel, size=plt.rcParams['font.size'])
-    ax1.set(ylabel=ylabel)
-    ax1.set_ylim(bottom=0)
-    ax2.set_ylim(bottom=0)
+        fig.suptitle(title, size=title_size)
+    fig.supxlabel(xlabel, size=font_size)
+    ax1.set(ylabel=ylabel, ylim=(0, None))
+    ax2.set(ylim=(0, None))
     ax2.legend(fontsize=legend_fontsize, loc=legend_loc, bbox_to_anchor=legend_bbox_to_anchor)
 
-    filename = f'./{experiment_dir}/{figure_filename}'
-    fig.savefig(f'{filename}.png')
-    fig.savefig(f'{filename}.svg')
-    fig.savefig(f'{filename}.pdf')
+    save_figure(config, fig, figure_filename)
+
+    export_table(config, data_base, data_trace)
 
-    export_table(data_base, data_trace)
+    return latencies_mean_base, latencies_mean_trace
 
 
 def plot_diff_mode(
+    config: Config,
+    latencies_mean_base: np.ndarray,
+    latencies_mean_trace: np.ndarray,
     same_plot: bool = True,
     title: str = 'Latency overhead of tracing for message publication',
     xlabel: str = 'publishing frequency (Hz)',
     ylabel_abs: str = 'mean latency overhead (ms)',
-    ylabel_per: str = 'mean latency overhead (\%)',  # noqa: W605 (escape necessary for TeX)
+    ylabel_per: str = 'mean latency overhead (%)',
     figure_filename: str = '6_results_overhead',
     legend_fontsize: int = 12,
 ) -> None:
     """
     Compute latency overhead and plot results.
 
+    The standard deviation of the difference between the two means is not plotted, since it is
+    too small (mostly by definition) to be significant.
+
+    :param config: the configuration
+    :param latencies_mean_base: the mean latencies for each (msg, freq) combination without tracing,
+        as computed by plot_modes()
+    :param latencies_mean_trace: the mean latencies for each (msg, freq) combination with tracing,
+        as computed by plot_modes()
     :param same_plot: whether to plot absolute and relative values (ms, %) in the same plot
     :param title: plot title
     :param xlabel: x axis label
@@ -423,87 +855,40 @@ def plot_diff_mode(
     :param legend_fontsize: the legend font size;
         a lower value than the default can help make it fit better into the plot
     """
+    if config.tex:
+        # Escape necessary for TeX
+        ylabel_per = ylabel_per.replace('%', r'\%')
+
     if same_plot:
         fig, (ax, ax2) = plt.subplots(1, 2, constrained_layout=True)
     else:
         fig, ax = plt.subplots(1, 1)
         fig2, ax2 = plt.subplots(1, 1)
 
-    for msg, msg_unit in msgs:
-        msg_full_unit = get_full_message_size_unit(msg_unit)
-        msg_freqs = []
-        msg_latency_diff = []
-        msg_latency_diff_stdev = []
-        msg_latency_diff_percent = []
-        for freq in freqs:
-            # print(f'{msg} {msg_full_unit}, {freq} Hz')
-            run_file_base = get_run_file('base', msg, msg_unit, freq)
-            run_file_trace = get_run_file('trace', msg, msg_unit, freq)
-
-            latency_mean_base = None
-            latency_mean_trace = None
-            if has_raw_latency_data:
-                latency_mean_base, latency_stdev_base, _, _, raw_latencies_base = \
-                    get_latency_data_raw(run_file_base)
-                latency_mean_trace, latency_stdev_trace, _, _, raw_latencies_trace = \
-                    get_latency_data_raw(run_file_trace)
-                # Standard deviation of the difference between the two means
-                # is too small (mostly by definition) to be significant
-                if False:
-                    # Compute standard deviation of the difference between the two means
-                    # given the two standard deviations and sample size
-                    #   SD_diff = sqrt((SD_base^2 / N_base) + (SD_trace^2 / N_trace))
-                    # See: https://stats.stackexchange.com/a/87505
-                    print('base size:', raw_latencies_base.size)
-                    print('trace size:', raw_latencies_trace.size)
-                    latency_diff_stdev = math.sqrt(
-                        (math.pow(latency_stdev_base, 2) / float(raw_latencies_base.size))
-                        + (math.pow(latency_stdev_trace, 2) / float(raw_latencies_trace.size))
-                    )
-                    print('base stdev:', latency_stdev_base)
-                    print('trace stdev:', latency_stdev_trace)
-                    print('diff stdev:', latency_diff_stdev)
-                    print()
-                    msg_latency_diff_stdev.append(latency_diff_stdev)
-            else:
-                latency_mean_base = get_latency_data(run_file_base)
-                latency_mean_trace = get_latency_data(run_file_trace)
-
-            def overhead(latency_base: float, latency_trace: float) -> float:
-                return 100.0 * (latency_trace - latency_base) / latency_base
-            msg_latency_diff_percent.append(overhead(latency_mean_base, latency_mean_trace))
-            latency_mean_diff = latency_mean_trace - latency_mean_base
-            msg_latency_diff.append(latency_mean_diff)
-            msg_freqs.append(freq)
-
-        legend_label = f'{msg} {msg_full_unit}'
-        if has_raw_latency_data:
-            # ax.errorbar(msg_freqs, msg_latency_diff, yerr=msg_latency_diff_stdev, capsize=5, fmt='-')
-            ax.plot(msg_freqs, msg_latency_diff, 'o-', label=legend_label)
-            ax2.plot(msg_freqs, msg_latency_diff_percent, 'o-', label=legend_label)
-        else:
-            ax.plot(msg_freqs, msg_latency_diff, 'D-', label=legend_label)
+    latencies_mean_diff = latencies_mean_trace - latencies_mean_base
+    latencies_mean_diff_percent = get_latency_overhead(latencies_mean_base, latencies_mean_trace)
+
+    legend_labels = [f'{msg} {get_full_message_size_unit(msg_unit)}' for msg, msg_unit in msgs]
+    if has_raw_latency_data:
+        plot_series(ax, freqs, latencies_mean_diff, legend_labels, marker='o')
+        plot_series(ax2, freqs, latencies_mean_diff_percent, legend_labels, marker='o')
+    else:
+        plot_series(ax, freqs, latencies_mean_diff, legend_labels)
 
     if include_plot_title:
         if same_plot:
-            fig.suptitle(title, size=plt.rcParams['axes.titlesize'])
+            fig.suptitle(title, size=title_size)
         else:
             ax.set(title=title)
             ax2.set(title=title)
-    ax.set(ylabel=ylabel_abs)
-    ax2.set(ylabel=ylabel_per)
-    ax.set_ylim(bottom=0)
-    ax2.set_ylim(bottom=0)
-    xticks = get_frequency_ticks()
-    for axis in (ax, ax2):
-        axis.set(xticks=xticks, xlim=(min(xticks), max(xticks) + 75))
-    ax.grid()
-    ax2.grid()
+    for axis, ylabel in ((ax, ylabel_abs), (ax2, ylabel_per)):
+        axis.set(ylabel=ylabel, ylim=(0, None), xticks=frequency_ticks, xlim=frequency_xlim)
+        axis.grid()
     if same_plot:
         ax2.yaxis.set_label_position('right')
         ax2.yaxis.tick_right()
         ax2.legend(fontsize=legend_fontsize)
-        fig.supxlabel(xlabel, size=plt.rcParams['font.size'])
+        fig.supxlabel(xlabel, size=font_size)
     else:
         ax.set(xlabel=xlabel)
         ax2.set(xlabel=xlabel)
@@ -511,21 +896,15 @@ def plot_diff_mode(
         fig.tight_layout()
         fig2.tight_layout()
 
-    filename = f'./{experiment_dir}/{figure_filename}'
     if same_plot:
-        fig.savefig(f'{filename}.png')
-        fig.savefig(f'{filename}.svg')
-        fig.savefig(f'{filename}.pdf')
+        save_figure(config, fig, figure_filename)
     else:
-        fig.savefig(f'{filename}_abs.png')
-        fig.savefig(f'{filename}_abs.svg')
-        fig.savefig(f'{filename}_abs.pdf')
-        fig2.savefig(f'{filename}_per.png')
-        fig2.savefig(f'{filename}_per.svg')
-        fig2.savefig(f'{filename}_per.pdf')
+        save_figure(config, fig, f'{figure_filename}_abs')
+        save_figure(config, fig2, f'{figure_filename}_per')
 
 
 def plot_aggregate(
+    config: Config,
     title: str = 'Agregate latencies without (left) and with tracing (right)',
     ylabel: str = 'latency overhead (ms)',
     figure_filename: str = '6_results_aggregate_overhead',
@@ -533,6 +912,7 @@ def plot_aggregate(
     """
     Plot aggregate overhead values for base and for tracing.
 
+    :param config: the configuration
     :param title: plot title
     :param ylabel: y axis label
     :param figure_filename: base file name for the figure (without file extension)
@@ -543,22 +923,30 @@ def plot_aggregate(
 
     fig, ax = plt.subplots(1, 1, constrained_layout=True)
 
-    diffs_base = []
-    diffs_trace = []
-    for msg, msg_unit in msgs:
-        for freq in freqs:
-            run_file_base = get_run_file('base', msg, msg_unit, freq)
-            run_file_trace = get_run_file('trace', msg, msg_unit, freq)
-            latency_mean_base, _, _, _, raw_latencies_base = get_latency_data_raw(run_file_base)
-            _, _, _, _, raw_latencies_trace = get_latency_data_raw(run_file_trace)
-            # For this (msg size, freq) tuple, subtract mean base
-            # latency from both base & trace raw latency values
-            offset = latency_mean_base
-            diffs_base.extend(raw_latencies_base - offset)
-            diffs_trace.extend(raw_latencies_trace - offset)
-
-    diffs_base = np.array(diffs_base)
-    diffs_trace = np.array(diffs_trace)
+    # Preallocate the arrays for all values, since the number of values of each run is known,
+    # and write the values of each run directly into them instead of concatenating copies
+    runs = [(msg, msg_unit, freq) for (msg, msg_unit), freq in itertools.product(msgs, freqs)]
+    summaries_base = [get_latency_data_raw(config, 'base', *run) for run in runs]
+    summaries_trace = [get_latency_data_raw(config, 'trace', *run) for run in runs]
+    diffs_base = np.empty(sum(num_latencies for _, _, _, _, num_latencies in summaries_base))
+    diffs_trace = np.empty(sum(num_latencies for _, _, _, _, num_latencies in summaries_trace))
+    start_base = 0
+    start_trace = 0
+    for run, summary_base, summary_trace in zip(runs, summaries_base, summaries_trace):
+        latency_mean_base, _, _, _, num_latencies_base = summary_base
+        _, _, _, _, num_latencies_trace = summary_trace
+        raw_latencies_base = get_latencies_raw(
+            config, 'base', *run, out=diffs_base[start_base:start_base + num_latencies_base])
+        raw_latencies_trace = get_latencies_raw(
+            config, 'trace', *run, out=diffs_trace[start_trace:start_trace + num_latencies_trace])
+        start_base += num_latencies_base
+        start_trace += num_latencies_trace
+        # For this (msg size, freq) tuple, subtract mean base
+        # latency from both base & trace raw latency values
+        # These are views of the new arrays, so this can be done in place
+        offset = latency_mean_base
+        raw_latencies_base -= offset
+        raw_latencies_trace -= offset
     base_mean = diffs_base.mean()
     base_stdev = diffs_base.std()
     base_median = np.median(diffs_base)
@@ -604,36 +992,82 @@ def plot_aggregate(
     ax.set_xticklabels(['base', 'trace'])
     ax.set(ylabel=ylabel)
 
-    filename = f'./{experiment_dir}/{figure_filename}'
-    fig.savefig(f'{filename}.png')
-    fig.savefig(f'{filename}.svg')
-    fig.savefig(f'{filename}.pdf')
+    save_figure(config, fig, figure_filename)
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Plot the results of an experiment run with the run_experiment.sh script.')
+    parser.add_argument(
+        'experiment_dir',
+        help='name of directory containing experiment data')
+    parser.add_argument(
+        '--interactive', action='store_true',
+        help='show the plots after saving them to files')
+    parser.add_argument(
+        '--tex', action='store_true',
+        help='render text using LaTeX instead of mathtext, which is much slower (requires a LaTeX installation); '
+             'only use it for final figures, e.g., with --formats pdf')
+    parser.add_argument(
+        '--formats', nargs='+', choices=('png', 'svg', 'pdf'), default=['png'],
+        help='file formats to save the figures as (default: %(default)s)')
+    return parser.parse_args(argv)
 
 
 def main(argv=sys.argv[1:]) -> int:
     """Plot experiment results for given experiment."""
-    if len(argv) != 1:
-        print('error: must provide only 1 argument: name of directory containing experiment data')
-        return 1
-    global experiment_dir
-    experiment_dir = argv[0].strip('/')
-    print(f'Experiment directory: {experiment_dir}')
+    args = parse_args(argv)
+    config = Config(
+        experiment_dir=args.experiment_dir.strip('/'),
+        interactive=args.interactive,
+        formats=tuple(args.formats),
+        tex=args.tex,
+    )
+    print(f'Experiment directory: {config.experiment_dir}')
     print(f'  frequencies    = {", ".join(str(f) for f in freqs)}')
     print(f'  messages       = {", ".join(str(m)+str(u) for m, u in msgs)}')
     print(f'  runtime_max    = {runtime_max}')
     print(f'  runtime_ignore = {runtime_ignore}')
 
+    # Only use a GUI backend if the plots are going to be shown
+    if not config.interactive:
+        plt.switch_backend('Agg')
     plt.rcParams.update({
-        'text.usetex': True,
+        'text.usetex': config.tex,
         'font.family': 'serif',
-        'font.size': 14,
-        'axes.titlesize': 20,
+        'font.size': font_size,
+        'axes.titlesize': title_size,
+        # Use fixed SVG element IDs, so that files only change if figures change
+        'svg.hashsalt': 'ros2_tracing-overhead-evaluation',
     })
 
-    plot_modes()
-    plot_diff_mode()
-    plot_aggregate()
-    plt.show()
+    # Find all run files first, which scans the experiment directory once and fails early if any is missing
+    run_files = [get_run_file(config, *run) for run in get_experiment_runs()]
+
+    if has_raw_latency_data:
+        if orjson is None:
+            print('orjson not found, so parsing logfiles will be slower; install it: pip3 install orjson')
+        if numba is None:
+            print('numba not found, so computing statistics will be slower; install it: pip3 install numba')
+        load_logfiles_raw(run_files)
+    else:
+        load_logfile_means(run_files)
+
+    latencies_mean_base, latencies_mean_trace = plot_modes(config)
+    plot_diff_mode(config, latencies_mean_base, latencies_mean_trace)
+    plot_aggregate(config)
+
+    # Free cached data before showing the plots
+    logfiles_raw.clear()
+    logfile_summaries_raw.clear()
+    logfile_means.clear()
+    get_run_file.cache_clear()
+    get_file_from_prefix.cache_clear()
+    get_experiment_dir_files.cache_clear()
+
+    if config.interactive:
+        plt.show()
 
     return 0
 